@@ -0,0 +1,259 @@
+"""Helpers shared by the generator and the document-rendering CLIs."""
+import io
+import os
+import re
+import string
+import sys
+import tarfile
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, List, Tuple
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import escape
+
+try:
+    from orjson import loads as json_loads  # optional: faster, parses bytes in C
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    from markupsafe import _speedups  # noqa: F401  C implementation of escape()
+    ESCAPE_SPEEDUPS = True
+except ImportError:
+    ESCAPE_SPEEDUPS = False
+
+FieldSpec = Tuple[str, str, Any, Optional[str]]
+RenderFn = Callable[[Dict[str, Any], Dict[str, Any]], bytes]
+NameFn = Callable[[Any], str]
+
+# `{{ fields.x }}` / `{{ customer.a.b }}` with no filters; any other Jinja syntax needs Jinja
+_SIMPLE_VAR_RE = re.compile(r"\{\{\s*(fields|customer)((?:\.\w+)+)\s*\}\}")
+_JINJA_SYNTAX_RE = re.compile(r"\{[{%#]")
+JSONL_READ_SIZE = 4 << 20  # bytes per read() in iter_jsonl
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+ISO_DATE_FMT = "%Y-%m-%d"
+
+# -------- JSON --------
+
+@lru_cache(maxsize=32)
+def _load_json_cached(str_path: str, mtime_ns: int) -> Dict[str, Any]:
+    # One read into bytes, parsed by orjson when installed (no text wrapper either way)
+    return json_loads(Path(str_path).read_bytes())
+
+def load_json(path: Path) -> Dict[str, Any]:
+    # Memoized on (path, mtime); the returned dict is shared, so treat it as read-only
+    return _load_json_cached(str(path), path.stat().st_mtime_ns)
+
+def iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the records of a JSONL file, skipping blank lines.
+
+    Reads JSONL_READ_SIZE blocks and splits them on newlines (carrying the partial
+    last line over), instead of iterating the file object line by line.
+    """
+    carry = b""
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            block = f.read(JSONL_READ_SIZE)
+            if not block:
+                break
+            lines = (carry + block).split(b"\n")
+            carry = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield json_loads(line)
+    if carry.strip():
+        yield json_loads(carry)
+
+# -------- Field declarations --------
+
+def resolve(doc: Dict[str, Any], parts: Tuple[str, ...]) -> Any:
+    # parts come from compile_fields; a missing segment raises KeyError
+    cur = doc
+    for part in parts:
+        cur = cur[part]
+    return cur
+
+def apply_format(value: Any, date_fmt: Optional[str]) -> Any:
+    if not date_fmt or not isinstance(value, str):
+        return value
+    if date_fmt == ISO_DATE_FMT and _ISO_DATE_RE.fullmatch(value):
+        return value  # already in the target format: skip the datetime round-trip
+    try:
+        dt = datetime.fromisoformat(value)
+        return dt.strftime(date_fmt)
+    except Exception:
+        return value
+
+# func: sources; each value is fixed for a run, so compile_fields evaluates it once
+_FUNCS: Dict[str, Callable[[], Any]] = {
+    "today": lambda: date.today().isoformat(),
+}
+
+def compute_func(name: str) -> Any:
+    if name not in _FUNCS:
+        raise ValueError(f"Unknown func: {name}")
+    return _FUNCS[name]()
+
+def parse_format(fmt: Optional[str]) -> Optional[str]:
+    # strftime pattern of a "date:..." format declaration, else None
+    return fmt.split("date:", 1)[1].strip() if fmt and fmt.startswith("date:") else None
+
+def compile_fields(fields_decl: List[Dict[str, Any]]) -> List[FieldSpec]:
+    """Pre-parse field declarations into (key, kind, arg, date_fmt) tuples.
+
+    kind is "pointer" (arg = tuple of path segments) or "const" (arg = the already
+    formatted value of a func: source, evaluated once here); date_fmt is the strftime
+    pattern of a "date:..." format, else None.
+    """
+    compiled: List[FieldSpec] = []
+    for fld in fields_decl:
+        source = fld.get("source") or ""
+        date_fmt = parse_format(fld.get("format"))
+
+        if source.startswith("/"):
+            kind, arg = "pointer", tuple(source.strip("/").split("/"))
+            if not all(arg):
+                raise ValueError(f"Invalid JSON pointer: {source}")
+        elif source.startswith("func:"):
+            # Constant for the run (e.g. func:today): compute and format it once
+            kind, arg = "const", apply_format(compute_func(source.split("func:", 1)[1]), date_fmt)
+            date_fmt = None
+        else:
+            raise ValueError(f"Unsupported source: {source}")
+        compiled.append((fld["key"], kind, arg, date_fmt))
+    return compiled
+
+def extract_fields(customer: Dict[str, Any], fields_spec: List[FieldSpec]) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {}
+    for key, kind, arg, date_fmt in fields_spec:
+        if kind == "pointer":
+            try:
+                value = resolve(customer, arg)
+            except (KeyError, TypeError):
+                raise KeyError(f"Path not found: /{'/'.join(arg)}") from None
+            fields[key] = apply_format(value, date_fmt)
+        else:
+            fields[key] = arg
+    return fields
+
+# -------- Templates --------
+
+def _lookup(env: Environment, doc: Any, parts: Tuple[str, ...]) -> Any:
+    # `x.a.b` resolved exactly as Jinja does: present keys of plain dicts directly, and
+    # anything else through env.getattr (attribute, then item, else Undefined, which
+    # renders as "" but raises UndefinedError if a further segment is read from it)
+    for part in parts:
+        if type(doc) is dict and part in doc:
+            doc = doc[part]
+        else:
+            doc = env.getattr(doc, part)
+    return doc
+
+def warn_without_escape_speedups() -> None:
+    # Autoescaped templates escape every substituted value; without the C extension
+    # markupsafe falls back to a much slower pure-Python escape()
+    if not ESCAPE_SPEEDUPS:
+        print("[warn] markupsafe C speedups are not installed; HTML escaping will be slow. "
+              "Reinstall markupsafe from a binary wheel.", file=sys.stderr)
+
+@lru_cache(maxsize=8)
+def template_env(templates_root: Optional[Path]) -> Environment:
+    # One Environment per templates root; its own cache keeps compiled templates
+    return Environment(
+        loader=FileSystemLoader(str(templates_root or Path("."))),
+        autoescape=select_autoescape(["html", "xml"]),
+        auto_reload=False,
+        cache_size=400,
+    )
+
+def compile_template(env: Environment, template_rel: str) -> RenderFn:
+    """Compile a template into a `render(fields, customer) -> bytes` (UTF-8) callable.
+
+    Templates that only substitute plain `{{ fields.x }}` / `{{ customer.a.b }}`
+    variables are rewritten once into a str.format string with one positional slot
+    per substitution, so rendering skips the Jinja runtime. Anything else (filters, loops, conditionals) uses Jinja.
+    """
+    template = env.get_template(template_rel)
+    # What Template.render does, minus its per-call wrapper and traceback rewriting
+    new_context, root_render_func = template.new_context, template.root_render_func
+
+    def render_jinja(fields: Dict[str, Any], customer: Dict[str, Any]) -> bytes:
+        ctx = new_context({"fields": fields, "customer": customer})
+        return "".join(root_render_func(ctx)).encode("utf-8")
+
+    source, _, _ = env.loader.get_source(env, template_rel)
+    if not env.keep_trailing_newline and source.endswith("\n"):
+        source = source[:-1]  # Jinja drops a single trailing newline
+
+    pieces: List[str] = []
+    slots: List[Tuple[bool, Tuple[str, ...]]] = []  # (is a fields.x lookup, path) per {i}
+    pos = 0
+    for m in _SIMPLE_VAR_RE.finditer(source):
+        literal = source[pos:m.start()]
+        if _JINJA_SYNTAX_RE.search(literal):
+            return render_jinja
+        root, path = m.group(1), tuple(m.group(2)[1:].split("."))
+        if any(hasattr(dict, part) for part in path):
+            return render_jinja  # e.g. `.items` resolves to the dict method in Jinja
+        if root == "fields" and len(path) > 1:
+            return render_jinja
+        pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+        pieces.append("{%d}" % len(slots))
+        slots.append((root == "fields", path))
+        pos = m.end()
+    literal = source[pos:]
+    if _JINJA_SYNTAX_RE.search(literal):
+        return render_jinja
+    pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+    fmt = "".join(pieces)
+
+    autoescape = env.autoescape(template_rel) if callable(env.autoescape) else env.autoescape
+    conv = escape if autoescape else str
+
+    def render_format(fields: Dict[str, Any], customer: Dict[str, Any]) -> bytes:
+        values = [conv(_lookup(env, fields if is_field else customer, path)) for is_field, path in slots]
+        return fmt.format(*values).encode("utf-8")
+
+    return render_format
+
+# -------- Output --------
+
+def compile_output_pattern(pattern: str) -> NameFn:
+    """Turn an output_pattern into a `name(customer_id) -> str` callable.
+
+    The usual "<prefix>{customer_id}<suffix>" shape becomes a plain concatenation;
+    anything else (format specs, other fields) keeps using str.format.
+    """
+    parsed = list(string.Formatter().parse(pattern))
+    if (parsed and parsed[0][1:] == ("customer_id", "", None)
+            and all(field is None for _, field, _, _ in parsed[1:])):
+        prefix = parsed[0][0]
+        suffix = "".join(literal for literal, _, _, _ in parsed[1:])
+        return lambda customer_id: f"{prefix}{customer_id}{suffix}"
+    return lambda customer_id: pattern.format(customer_id=customer_id)
+
+def write_document(name: str,
+                   data: bytes,
+                   out_dir: Path,
+                   archive: Optional[tarfile.TarFile] = None) -> str:
+    """Write a rendered document into `archive` if given, else into out_dir
+    (which the caller must have created); returns the member name or file path."""
+    if archive is not None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = time.time()
+        archive.addfile(info, io.BytesIO(data))
+        return name
+
+    # One open/write/close on a raw fd; os.write may write less than asked, so loop
+    out_path = os.path.join(out_dir, name)
+    fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return out_path
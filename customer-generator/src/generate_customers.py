@@ -2,15 +2,28 @@
 import argparse
 import json
 import random
+import string
 import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from bisect import bisect_left
 from datetime import date, datetime, timedelta
+from itertools import accumulate
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple, List
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from typing import Any, Dict, Iterator, Optional, Tuple, List
 
 from faker import Faker
+from faker.providers.person.en_GB import Provider as PersonProvider
 from jsonschema import Draft202012Validator
 
+from common import load_json
+
+try:
+    import orjson  # optional: much faster JSON encoding
+except ImportError:
+    orjson = None
+
 # -------- Helpers & constants --------
 
 SG_CITIES = [
@@ -38,125 +51,296 @@ DEFAULT_MONTHLY_RANGES = {
     "Student": (0, 1500),
 }
 
-fake = Faker("en_GB")  # generic English names; avoid unsupported locales
-
-def load_json(path: Path) -> Dict[str, Any]:
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+NRIC_PREFIXES = "STFG"
+NRIC_CHECKSUMS = "ABCDEFGHIZJKLMN"  # not real; just looks valid
 
-def weighted_choice(weights: Dict[str, float]) -> str:
-    items = list(weights.items())
-    choices, probs = zip(*items)
-    return random.choices(list(choices), weights=list(probs), k=1)[0]
+GENDERS = ["Male", "Female", "Other", "Prefer not to say"]
 
-def triangular(lo: float, hi: float, mode_frac: float = 0.35) -> float:
-    mode = lo + mode_frac * (hi - lo)
-    return random.triangular(lo, hi, mode)
+MONTHLY_MODE_FRAC = 0.35  # mode of the monthly income distribution within [lo, hi]
 
-def random_dob(age_min: int, age_max: int) -> date:
-    """Generate DOB so that age is between [age_min, age_max]."""
-    today = date.today()
-    # Convert age range to DOB range
-    latest_dob = today.replace(year=today.year - age_min)
-    earliest_dob = today.replace(year=today.year - age_max) - timedelta(days=365)
-    span_days = (latest_dob - earliest_dob).days
-    return earliest_dob + timedelta(days=random.randint(0, span_days))
-
-def age_from_dob(dob: date) -> int:
-    today = date.today()
-    years = today.year - dob.year
-    if (today.month, today.day) < (dob.month, dob.day):
-        years -= 1
-    return years
+fake = Faker("en_GB")  # generic English names; avoid unsupported locales
 
-def gen_passport_number() -> str:
+# Name pools lifted from the en_GB provider so the hot loop never calls into Faker
+FIRST_NAMES = tuple(PersonProvider.first_names)
+LAST_NAMES = tuple(PersonProvider.last_names)
+LAST_NAME_WEIGHTS = tuple(PersonProvider.last_names.values())
+FAKE_COUNTRY_CODE = fake.current_country_code()
+
+# Cities and address parts (street, town, postcode) come from Faker; sample each from a
+# pool of this size. Addresses are composed per record, so they stay (nearly) unique.
+FAKER_POOL_SIZE = 1000
+BUILDING_NUMBERS = range(1, 1000)
+
+# --validate sample: always check the first records of each chunk, then a random fraction
+VALIDATE_SAMPLE_HEAD = 100
+VALIDATE_SAMPLE_RATE = 0.01
+
+GEN_BATCH = 10_000       # records per column batch; bounds memory independently of --count
+GEN_TASK_SIZE = 50_000   # records per seeded task (task k uses seed ^ k)
+GEN_WINDOW = 2           # tasks in flight per worker process
+
+PASSPORT_PROB = (0.6, 0.95)           # (minor, adult): most adults have one, minors less likely
+PASSPORT_ISSUE_MAX_DAYS = 3652        # issued within the last 10 years
+PASSPORT_EXPIRY_DAYS = (365, 3652)    # expires 1-10 years from today
+
+if orjson is not None:
+    def dumps_line(record: Dict[str, Any]) -> bytes:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    def dumps_line(record: Dict[str, Any]) -> bytes:
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+def cumulative_weights(weights: Dict[str, float]) -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+    """Normalize non-negative weights into (keys, CDF) for bulk random.choices draws."""
+    total = sum(max(0.0, v) for v in weights.values()) or 1.0
+    cdf = accumulate(max(0.0, v) / total for v in weights.values())
+    return tuple(weights), tuple(cdf)
+
+def years_before(day: date, years: int) -> date:
+    """Same month/day `years` earlier (Feb 29 falls back to Feb 28)."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+def dob_ordinal_range(today: date, age_min: int, age_max: int) -> Tuple[int, int]:
+    """Return (earliest, latest) DOB ordinals so that age is between [age_min, age_max]."""
+    latest_dob = years_before(today, age_min)
+    earliest_dob = years_before(today, age_max) - timedelta(days=365)
+    return earliest_dob.toordinal(), latest_dob.toordinal()
+
+def birthday_cutoffs(today: date, max_years: int) -> List[int]:
+    """Ascending ordinals of the latest DOB giving age >= a, for a = max_years..1.
+
+    age(dob_ord) == len(cutoffs) - bisect_left(cutoffs, dob_ord)
+    """
+    return [years_before(today, a).toordinal() for a in range(max_years, 0, -1)]
+
+def gen_passport_numbers(n: int) -> List[str]:
     # Synthetic: two letters + 7 digits
-    return f"{fake.random_uppercase_letter()}{fake.random_uppercase_letter()}{random.randint(1000000, 9999999)}"
+    letters = "".join(random.choices(string.ascii_uppercase, k=2 * n))
+    numbers = random.choices(range(1000000, 10000000), k=n)
+    return [f"{letters[2 * j:2 * j + 2]}{num}" for j, num in enumerate(numbers)]
 
-def gen_sg_nric_number() -> str:
+def gen_sg_nric_numbers(n: int) -> List[str]:
     # Synthetic NRIC-like format: prefix + 7 digits + checksum (fake)
-    prefix = random.choice(["S", "T", "F", "G"])
-    digits = [random.randint(0, 9) for _ in range(7)]
-    checksum = random.choice(list("ABCDEFGHIZJKLMN"))  # not real; just looks valid
-    return prefix + "".join(str(d) for d in digits) + checksum
+    prefixes = random.choices(NRIC_PREFIXES, k=n)
+    digits = "".join(random.choices(string.digits, k=7 * n))
+    checksums = random.choices(NRIC_CHECKSUMS, k=n)
+    return [prefix + digits[7 * j:7 * j + 7] + checksum
+            for j, (prefix, checksum) in enumerate(zip(prefixes, checksums))]
+
+def gen_customer_ids(n: int, fast: bool = False) -> List[str]:
+    """uuid4 ids; with `fast`, derive them from one bulk draw of the (seedable) `random` RNG
+    instead of an os.urandom call per id. Fast ids are not cryptographically random."""
+    if not fast:
+        return [str(uuid.uuid4()) for _ in range(n)]
+    raw = random.randbytes(16 * n)
+    return [str(uuid.UUID(bytes=raw[16 * j:16 * j + 16], version=4)) for j in range(n)]
+
+def _faker_pool(provider_fn, n: int) -> List[str]:
+    """Call a Faker provider up to FAKER_POOL_SIZE times, seeded from `random`."""
+    fake.seed_instance(random.getrandbits(32))
+    return [provider_fn() for _ in range(min(n, FAKER_POOL_SIZE))]
 
 def compute_income(emp_type: str,
-                   ranges_cfg: Dict[str, Tuple[float, float]]) -> Tuple[float, float]:
+                   ranges_cfg: Dict[str, Tuple[float, float]],
+                   monthly_frac: float,
+                   annual_jitter: float) -> Tuple[float, float]:
     lo, hi = ranges_cfg.get(emp_type, (2000, 10000))
-    monthly = round(triangular(lo, hi), 2)
+    monthly = round(lo + monthly_frac * (hi - lo), 2)
     if emp_type in ("Unemployed", "Student"):
         monthly = max(0.0, monthly)
-    annual = round(monthly * 12 * (1 + random.uniform(-0.05, 0.05)), 2)  # ±5%
+    annual = round(monthly * 12 * (1 + annual_jitter), 2)  # ±5%
     return monthly, annual
 
 
-# -------- Core generator --------
+@dataclass(frozen=True)
+class GenSettings:
+    """Generation parameters derived once from the raw config dict."""
+    min_age: int
+    max_age: int
+    country: str
+    nationality: str
+    currency: str
+    emp_keys: Tuple[str, ...]
+    emp_cdf: Tuple[float, ...]
+    ranges: Dict[str, Tuple[float, float]]
 
-def gen_customer(schema: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
-    # Config parameters
-    min_age = int(config.get("min_age", 0))
-    max_age = int(config.get("max_age", 90))
+def prepare_config(config: Dict[str, Any]) -> GenSettings:
     fixed_country = config.get("country")  # e.g., "SG"
     fixed_currency = config.get("currency")  # e.g., "SGD"
-
-    # Demographics base from config/country
-    if fixed_country == "SG":
-        country = "SG"
-        city = random.choice(SG_CITIES)
+    country = fixed_country or FAKE_COUNTRY_CODE
+
+    emp_keys, emp_cdf = cumulative_weights(config.get("employment_distribution", DEFAULT_EMPLOY_DIST))
+
+    rngs_cfg_in = config.get("monthly_income_ranges", {})
+    ranges_cfg: Dict[str, Tuple[float, float]] = {}
+    for k, default in DEFAULT_MONTHLY_RANGES.items():
+        if k in rngs_cfg_in:
+            lo, hi = rngs_cfg_in[k]
+            ranges_cfg[k] = (float(lo), float(hi))
+        else:
+            ranges_cfg[k] = default
+
+    return GenSettings(
+        min_age=int(config.get("min_age", 0)),
+        max_age=int(config.get("max_age", 90)),
+        country=country,
+        nationality=config.get("nationality") or country,
+        currency=fixed_currency or ("SGD" if country == "SG" else "USD"),
+        emp_keys=emp_keys,
+        emp_cdf=emp_cdf,
+        ranges=ranges_cfg,
+    )
+
+@dataclass
+class RandomDraws:
+    """Random values for a whole batch, drawn up front and consumed by record index."""
+    city: List[str]
+    first_name: List[str]
+    last_name: List[str]
+    address: List[str]
+    gender: List[str]
+    dob_ord: List[int]
+    nric_number: List[str]
+    passport_u: List[float]
+    monthly_frac: List[float]   # unit triangular draw, scaled to the employment range
+    annual_jitter: List[float]
+
+def _prealloc_randoms(n: int, settings: GenSettings, today: date) -> RandomDraws:
+    min_dob_ord, max_dob_ord = dob_ordinal_range(today, settings.min_age, settings.max_age)
+
+    if settings.country == "SG":
+        cities = SG_CITIES
     else:
-        country = fixed_country or fake.current_country_code()
-        city = fake.city()
+        cities = _faker_pool(fake.city, n)
+    streets = _faker_pool(fake.street_name, n)
+    towns = _faker_pool(fake.city, n)
+    postcodes = _faker_pool(fake.postcode, n)
+    addresses = [
+        f"{number} {street}, {town}, {postcode}"
+        for number, street, town, postcode in zip(
+            random.choices(BUILDING_NUMBERS, k=n),
+            random.choices(streets, k=n),
+            random.choices(towns, k=n),
+            random.choices(postcodes, k=n),
+        )
+    ]
+
+    rnd = random.random
+    tri = random.triangular
+    uni = random.uniform
+    return RandomDraws(
+        city=random.choices(cities, k=n),
+        first_name=random.choices(FIRST_NAMES, k=n),
+        last_name=random.choices(LAST_NAMES, weights=LAST_NAME_WEIGHTS, k=n),
+        address=addresses,
+        gender=random.choices(GENDERS, k=n),
+        dob_ord=random.choices(range(min_dob_ord, max_dob_ord + 1), k=n),
+        nric_number=gen_sg_nric_numbers(n),
+        passport_u=[rnd() for _ in range(n)],
+        monthly_frac=[tri(0.0, 1.0, MONTHLY_MODE_FRAC) for _ in range(n)],
+        annual_jitter=[uni(-0.05, 0.05) for _ in range(n)],
+    )
 
-    # Personal details
-    first_name = fake.first_name()
-    last_name = fake.last_name()
-    full_name = f"{first_name} {last_name}"
 
-    nationality = config.get("nationality") or country
-    address = fake.address().replace("\n", ", ")
+# -------- Core generator --------
 
-    dob = random_dob(min_age, max_age)
-    age = age_from_dob(dob)
+Columns = Dict[str, List[Any]]
 
-    personal_details = {
-        "name": full_name,
-        "nationality": nationality,
-        "date_of_birth": dob.isoformat(),
-        "address": address
-    }
+def gen_customers_batch(n: int, settings: GenSettings, fast_ids: bool = False) -> Columns:
+    """Generate `n` customers as columns: one list per field, None where a field is absent.
 
-    gender = random.choice(["Male", "Female", "Other", "Prefer not to say"])
-    demographics = {
-        "age": age,
-        "gender": gender,
-        "country": country,
-        "city": city
+    Nested record dicts are only built at serialization time by _row_to_dict.
+    """
+    today = date.today()
+    draws = _prealloc_randoms(n, settings, today)
+    country = settings.country
+
+    # Ages by integer comparison of DOB ordinals against per-age birthday cutoffs
+    cutoffs = birthday_cutoffs(today, settings.max_age + 2)
+    n_cutoffs = len(cutoffs)
+    ages = [n_cutoffs - bisect_left(cutoffs, o) for o in draws.dob_ord]
+
+    # Passport mask, then numbers/dates drawn for holders only
+    has_passport = [u < PASSPORT_PROB[age >= 18] for u, age in zip(draws.passport_u, ages)]
+    holders = sum(has_passport)
+    today_ord = today.toordinal()
+    exp_lo, exp_hi = PASSPORT_EXPIRY_DAYS
+    pp_numbers = iter(gen_passport_numbers(holders))
+    pp_issue = iter(random.choices(range(today_ord - PASSPORT_ISSUE_MAX_DAYS, today_ord + 1), k=holders))
+    pp_expiry = iter(random.choices(range(today_ord + exp_lo, today_ord + exp_hi + 1), k=holders))
+
+    # Financials for adults only
+    adult_emp = iter(random.choices(settings.emp_keys, cum_weights=settings.emp_cdf, k=sum(age >= 18 for age in ages)))
+    emp_types = [next(adult_emp) if age >= 18 else None for age in ages]
+    incomes = [compute_income(emp, settings.ranges, frac, jitter) if emp is not None else (None, None)
+               for emp, frac, jitter in zip(emp_types, draws.monthly_frac, draws.annual_jitter)]
+
+    return {
+        "customer_id": gen_customer_ids(n, fast_ids),
+        "name": [f"{first} {last}" for first, last in zip(draws.first_name, draws.last_name)],
+        "nationality": [settings.nationality] * n,
+        "date_of_birth": [date.fromordinal(o).isoformat() for o in draws.dob_ord],
+        "address": draws.address,
+        "age": ages,
+        "gender": draws.gender,
+        "country": [country] * n,
+        "city": draws.city,
+        "nric_number": draws.nric_number if country == "SG" else [None] * n,
+        "passport_number": [next(pp_numbers) if has else None for has in has_passport],
+        "passport_issue_date": [date.fromordinal(next(pp_issue)).isoformat() if has else None
+                                for has in has_passport],
+        "passport_expiry_date": [date.fromordinal(next(pp_expiry)).isoformat() if has else None
+                                 for has in has_passport],
+        "employment_type": emp_types,
+        "monthly_income": [monthly for monthly, _ in incomes],
+        "annual_income": [annual for _, annual in incomes],
+        "currency": [settings.currency] * n,
     }
 
+def _row_to_dict(i: int, cols: Columns) -> Dict[str, Any]:
+    """Materialize record `i` of a column batch as a nested customer dict."""
+    nationality = cols["nationality"][i]
+    address = cols["address"][i]
+    country = cols["country"][i]
+    city = cols["city"][i]
+
     customer: Dict[str, Any] = {
-        "customer_id": str(uuid.uuid4()),
-        "personal_details": personal_details,
-        "demographics": demographics
+        "customer_id": cols["customer_id"][i],
+        "personal_details": {
+            "name": cols["name"][i],
+            "nationality": nationality,
+            "date_of_birth": cols["date_of_birth"][i],
+            "address": address
+        },
+        "demographics": {
+            "age": cols["age"][i],
+            "gender": cols["gender"][i],
+            "country": country,
+            "city": city
+        }
     }
 
     # ID documents (copy nationality/address from personal_details)
     id_documents: Dict[str, Any] = {}
 
-    if country == "SG":
+    nric_number = cols["nric_number"][i]
+    if nric_number is not None:
         id_documents["nric"] = {
-            "nric_number": gen_sg_nric_number(),
-            "nationality": personal_details["nationality"],
-            "address": personal_details["address"]
+            "nric_number": nric_number,
+            "nationality": nationality,
+            "address": address
         }
 
-    # Give most adults a passport; minors too (optional) but less likely
-    have_passport = random.random() < (0.95 if age >= 18 else 0.6)
-    if have_passport:
+    passport_number = cols["passport_number"][i]
+    if passport_number is not None:
         id_documents["passport"] = {
-            "passport_number": gen_passport_number(),
-            "nationality": personal_details["nationality"],
-            "issue_date": fake.date_between(start_date="-10y", end_date="today").isoformat(),
-            "expiry_date": fake.date_between(start_date="+1y", end_date="+10y").isoformat(),
+            "passport_number": passport_number,
+            "nationality": nationality,
+            "issue_date": cols["passport_issue_date"][i],
+            "expiry_date": cols["passport_expiry_date"][i],
             "issuing_country": country,
             "place_of_issue": city
         }
@@ -164,41 +348,71 @@ def gen_customer(schema: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, An
     if id_documents:
         customer["id_documents"] = id_documents
 
-    # Financials for adults only
-    if age >= 18:
-        emp_dist = config.get("employment_distribution", DEFAULT_EMPLOY_DIST)
-        total = sum(max(0.0, v) for v in emp_dist.values()) or 1.0
-        emp_dist = {k: max(0.0, v) / total for k, v in emp_dist.items()}
-
-        emp_type = weighted_choice(emp_dist)
-
-        rngs_cfg_in = config.get("monthly_income_ranges", {})
-        ranges_cfg: Dict[str, Tuple[float, float]] = {}
-        for k, default in DEFAULT_MONTHLY_RANGES.items():
-            if k in rngs_cfg_in:
-                lo, hi = rngs_cfg_in[k]
-                ranges_cfg[k] = (float(lo), float(hi))
-            else:
-                ranges_cfg[k] = default
-
-        monthly, annual = compute_income(emp_type, ranges_cfg)
-        currency = fixed_currency or ("SGD" if country == "SG" else "USD")
-
+    emp_type = cols["employment_type"][i]
+    if emp_type is not None:
         customer["financials"] = {
             "employment_type": emp_type,
-            "monthly_income": monthly,
-            "annual_income": annual,
-            "currency": currency
+            "monthly_income": cols["monthly_income"][i],
+            "annual_income": cols["annual_income"][i],
+            "currency": cols["currency"][i]
         }
 
-    # Validate
-    validator = Draft202012Validator(schema)
-    errors = sorted(validator.iter_errors(customer), key=lambda e: e.path)
-    if errors:
+    return customer
+
+def validate_customer(validator: Draft202012Validator, customer: Dict[str, Any]) -> None:
+    # Only collect and sort errors on the slow path
+    if not validator.is_valid(customer):
+        errors = sorted(validator.iter_errors(customer), key=lambda e: e.path)
         msgs = "\n".join(f"- {'/'.join(map(str, e.path))}: {e.message}" for e in errors)
         raise ValueError(f"Generated customer failed schema validation:\n{msgs}")
 
-    return customer
+# -------- Batch / workers --------
+
+def iter_chunk(schema_path: Path,
+               config_path: Optional[Path],
+               seed: Optional[int],
+               count: int,
+               fast_ids: bool = False,
+               validate: str = "all") -> Iterator[Tuple[bytes, int]]:
+    """Generate `count` customers, yielding (encoded JSON lines, records validated)
+    per GEN_BATCH-record column batch.
+
+    Each call seeds its own RNG and builds its own validator, so pool workers share
+    no state; columns and encoded output only ever cover one batch.
+    """
+    random.seed(seed)
+    sampler = random.Random(seed)  # separate stream so sampling never changes the data
+
+    schema = load_json(schema_path)
+    settings = prepare_config(load_json(config_path) if config_path else {})
+    Draft202012Validator.check_schema(schema)
+    validator = Draft202012Validator(schema)
+
+    for start in range(0, count, GEN_BATCH):
+        n = min(GEN_BATCH, count - start)
+        cols = gen_customers_batch(n, settings, fast_ids)
+        out: List[bytes] = []
+        validated = 0
+        for i in range(n):
+            customer = _row_to_dict(i, cols)
+            if validate == "all" or (validate == "sample" and (
+                    start + i < VALIDATE_SAMPLE_HEAD or sampler.random() < VALIDATE_SAMPLE_RATE)):
+                validate_customer(validator, customer)
+                validated += 1
+            out.append(dumps_line(customer))
+        yield b"".join(out), validated
+
+def generate_chunk(*chunk_args: Any) -> Tuple[bytes, int]:
+    """iter_chunk joined into one (lines, records validated) result, for pool workers."""
+    bufs, validated = [], 0
+    for buf, n_valid in iter_chunk(*chunk_args):
+        bufs.append(buf)
+        validated += n_valid
+    return b"".join(bufs), validated
+
+def _task_sizes(count: int) -> List[int]:
+    full, rem = divmod(count, GEN_TASK_SIZE)
+    return [GEN_TASK_SIZE] * full + ([rem] if rem else [])
 
 # -------- CLI --------
 
@@ -209,22 +423,47 @@ def main():
     ap.add_argument("--config", type=Path, help="Path to customer config JSON")
     ap.add_argument("--out", type=Path, default=Path("gen_data_out/customers.jsonl"), help="Output JSONL file")
     ap.add_argument("--seed", type=int, default=None, help="Random seed")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Worker processes to generate with (each %d-record task k is seeded with seed ^ k)"
+                         % GEN_TASK_SIZE)
+    ap.add_argument("--fast-ids", action="store_true",
+                    help="Derive customer ids from the seeded RNG instead of uuid4 (reproducible, not cryptographic)")
+    ap.add_argument("--validate", choices=["all", "sample", "none"], default="all",
+                    help="Schema-validate every record, a sample (first %d per task + %d%%), or none"
+                         % (VALIDATE_SAMPLE_HEAD, VALIDATE_SAMPLE_RATE * 100))
 
     args = ap.parse_args()
 
-    if args.seed is not None:
-        random.seed(args.seed)
-
-    schema = load_json(args.schema)
-    config: Dict[str, Any] = load_json(args.config) if args.config else {}
+    # Fixed-size tasks with per-task seeds: output for a seed is the same for any
+    # --workers, and no task holds more than GEN_TASK_SIZE records in memory
+    chunk_args = [(args.schema, args.config, None if args.seed is None else args.seed ^ task_id,
+                   size, args.fast_ids, args.validate)
+                  for task_id, size in enumerate(_task_sizes(args.count))]
 
+    validated = 0
     args.out.parent.mkdir(parents=True, exist_ok=True)
-    with args.out.open("w", encoding="utf-8") as f:
-        for _ in range(args.count):
-            record = gen_customer(schema, config)
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    print(f"Wrote {args.count} customers to {args.out}")
+    with args.out.open("wb") as f:
+        if args.workers <= 1 or len(chunk_args) <= 1:
+            for a in chunk_args:
+                for buf, n_valid in iter_chunk(*a):
+                    f.write(buf)
+                    validated += n_valid
+        else:
+            # Bounded window of in-flight tasks, written in task order as they complete
+            with ProcessPoolExecutor(max_workers=args.workers) as ex:
+                pending: deque = deque()
+                for a in chunk_args:
+                    pending.append(ex.submit(generate_chunk, *a))
+                    if len(pending) >= args.workers * GEN_WINDOW:
+                        buf, n_valid = pending.popleft().result()
+                        f.write(buf)
+                        validated += n_valid
+                while pending:
+                    buf, n_valid = pending.popleft().result()
+                    f.write(buf)
+                    validated += n_valid
+
+    print(f"Wrote {args.count} customers to {args.out} (schema-validated {validated})")
 
 if __name__ == "__main__":
     main()
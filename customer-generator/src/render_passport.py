@@ -1,98 +1,220 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import os
+import sys
+import tarfile
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, Optional, List
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from typing import Any, Callable, Dict, Optional, List, Tuple, Union
+from jinja2 import Environment, TemplateNotFound
 import traceback
 
-def load_json(path: Path) -> Dict[str, Any]:
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
-def _resolve_pointer(doc: Dict[str, Any], pointer: str) -> Any:
-    if not pointer or pointer[0] != "/":
-        raise ValueError(f"Invalid JSON pointer: {pointer}")
-    cur = doc
-    for part in pointer.strip("/").split("/"):
-        if isinstance(cur, dict) and part in cur:
-            cur = cur[part]
+from common import (FieldSpec, NameFn, RenderFn, apply_format, compile_fields, compile_output_pattern,
+                    compile_template, iter_jsonl, load_json, template_env,
+                    warn_without_escape_speedups, write_document)
+
+PASSPORT_COUNTRIES = ("SG", "MY", "CN", "IN")
+RENDER_CHUNKSIZE = 32   # customers pickled per worker task
+RENDER_WINDOW = 4       # tasks kept in flight per worker process
+
+Extractor = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+def compile_extractor(fields_spec: List[FieldSpec]) -> Extractor:
+    """Generate an `extract(customer) -> fields` function from common.compile_fields output.
+
+    Each declared field becomes straight-line code (`c["a"]["b"]` subscripts for a
+    pointer, a literal for a const, an apply_format call only where a date format is
+    declared), so extraction runs no per-field loop or dispatch. A parent object shared
+    by several pointers (e.g. /id_documents/passport) is bound to a local by the first
+    field that reaches it, and later fields index that local.
+    """
+    parents = Counter(arg[:-1] for _, kind, arg, _ in fields_spec if kind == "pointer")
+    shared = {parent for parent, uses in parents.items() if parent and uses > 1}
+    bound: Dict[Tuple[str, ...], str] = {}
+
+    lines = ["def extract(c):", "    f = {}"]
+    for key, kind, arg, date_fmt in fields_spec:
+        if kind == "const":
+            lines.append(f"    f[{key!r}] = {arg!r}")
+            continue
+        parent, last = arg[:-1], arg[-1]
+        if parent in bound:
+            resolve_lines = [f"v = {bound[parent]}[{last!r}]"]
+        elif parent in shared:
+            bound[parent] = var = f"p{len(bound)}"
+            resolve_lines = [f"{var} = c" + "".join(f"[{part!r}]" for part in parent),
+                             f"v = {var}[{last!r}]"]
         else:
-            raise KeyError(f"Path not found: {pointer}")
-    return cur
-
-def _apply_format(value: Any, fmt: Optional[str]) -> Any:
-    from datetime import datetime
-    if not fmt or not isinstance(value, str):
-        return value
-    if fmt.startswith("date:"):
+            resolve_lines = ["v = c" + "".join(f"[{part!r}]" for part in arg)]
+        lines += [
+            "    try:",
+            *("        " + line for line in resolve_lines),
+            "    except (KeyError, TypeError):",
+            f"        raise KeyError({'Path not found: /' + '/'.join(arg)!r}) from None",
+        ]
+        lines.append(f"    f[{key!r}] = " + ("v" if date_fmt is None else f"apply_format(v, {date_fmt!r})"))
+    lines.append("    return f")
+
+    namespace: Dict[str, Any] = {"apply_format": apply_format}
+    exec(compile("\n".join(lines), "<passport fields>", "exec"), namespace)
+    return namespace["extract"]
+
+def load_passport_templates(env: Environment, template_rel: str) -> Dict[str, Optional[RenderFn]]:
+    """Compile the per-country passport templates once, e.g. templates/passport_SG.html.
+
+    Keyed by every PASSPORT_COUNTRIES code, so nationality dispatch is a single dict
+    lookup. Countries without their own template use the schema's generic
+    `template_rel`; if that is missing too the country maps to None.
+    """
+    templates: Dict[str, Optional[RenderFn]] = dict.fromkeys(PASSPORT_COUNTRIES)
+    missing = []
+    for country in PASSPORT_COUNTRIES:
         try:
-            dt = datetime.fromisoformat(value)
-            return dt.strftime(fmt.split("date:", 1)[1].strip())
-        except Exception:
-            return value
-    return value
-
-def _compute_func(name: str) -> Any:
-    from datetime import datetime
-    if name == "today":
-        return datetime.today().date().isoformat()
-    raise ValueError(f"Unknown func: {name}")
-
-def render_passport_html(customer: Dict[str, Any],
-                         schema_path: Path,
-                         render_templates_root: Optional[Path],
-                         out_dir: Path) -> Path:
+            templates[country] = compile_template(env, f"passport_{country}.html")
+        except TemplateNotFound:
+            missing.append(country)
+    if missing:
+        # fallback to generic template if specific not found; compiled once and shared
+        try:
+            fallback = compile_template(env, template_rel)
+        except TemplateNotFound:
+            fallback = None
+        for country in missing:
+            templates[country] = fallback
+    return templates
+
+Document = Tuple[str, bytes]
+RenderResult = Tuple[Optional[str], Union[None, str, Document], Optional[str]]
+
+def render_passport(customer: Dict[str, Any],
+                    output_name: NameFn,
+                    extract: Extractor,
+                    templates: Dict[str, Optional[RenderFn]]) -> Optional[Tuple[str, Document]]:
+    """Render one customer's passport to (passport country, (file name, UTF-8 HTML));
+    None if they have none. Prints nothing, so it can run in pool workers."""
     passport = customer.get("id_documents", {}).get("passport")
     if not passport:
         # No passport for this customer, skip rendering
         return None
-    schema = load_json(schema_path)
-    template_rel = schema["template"]
-    output_pattern = schema.get("output_pattern", "passport_{customer_id}.html")
-    fields_decl: List[Dict[str, Any]] = schema["fields"]
-
-    fields: Dict[str, Any] = {}
-    for fld in fields_decl:
-        key = fld["key"]
-        source = fld.get("source")
-        fmt = fld.get("format")
-
-        if source.startswith("/"):
-            val = _resolve_pointer(customer, source)
-        elif source.startswith("func:"):
-            val = _compute_func(source.split("func:", 1)[1])
-        else:
-            raise ValueError(f"Unsupported source: {source}")
 
-        fields[key] = _apply_format(val, fmt)
+    fields = extract(customer)
 
     # Choose passport template based on nationality/country
     nationality = fields.get("nationality") or fields.get("country") or customer.get("demographics", {}).get("country")
-    passport_country = nationality if nationality in {"SG", "MY", "CN", "IN"} else "SG"
-    print(f"Rendering passport for country: {passport_country}")
-    # e.g. templates/passport_SG.html, templates/passport_MY.html, etc.
-    passport_template = f"passport_{passport_country}.html"
+    passport_country = nationality if nationality in templates else "SG"
+    render = templates[passport_country]
+    if render is None:
+        raise ValueError(f"No passport template found for {passport_country}")
+
+    return passport_country, (output_name(customer["customer_id"]), render(fields, customer))
+
+def passport_output_name(cfg: Dict[str, Any]) -> NameFn:
+    return compile_output_pattern(cfg.get("output_pattern", "passport_{customer_id}.html"))
+
+# Per-process render state, filled by _init_worker
+_worker: Dict[str, Any] = {}
+
+def _init_worker(schema: Path, templates_root: Path, out_dir: Optional[Path]) -> None:
+    # Runs once per pool process: the schema, Jinja env and templates stay in worker memory
+    cfg = load_json(schema)
+    _worker["render_args"] = dict(
+        output_name=passport_output_name(cfg),
+        extract=compile_extractor(compile_fields(cfg["fields"])),
+        templates=load_passport_templates(template_env(templates_root), cfg["template"]),
+    )
+    _worker["out_dir"] = out_dir
+
+def _render_one(customer: Dict[str, Any]) -> RenderResult:
+    """Pool task: (country, result, None) on success, (None, None, error with traceback)
+    on failure.
+
+    result is the written path, or the rendered document itself when the worker has no
+    out_dir (the parent adds it to the archive); country and result are None if there
+    is no passport. The parent does all the logging, so output stays in input order.
+    """
     try:
-        env = Environment(
-            loader=FileSystemLoader(str(render_templates_root or ".")),
-            autoescape=select_autoescape(["html", "xml"])
-        )
-        template = env.get_template(passport_template)
-    except Exception:
-        # fallback to generic template if specific not found
-        env = Environment(
-            loader=FileSystemLoader(str(render_templates_root or ".")),
-            autoescape=select_autoescape(["html", "xml"])
-        )
-        template = env.get_template(template_rel)
-
-    html = template.render(fields=fields, customer=customer)
-
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / output_pattern.format(customer_id=customer["customer_id"])
-    out_path.write_text(html, encoding="utf-8")
-    return out_path
+        rendered = render_passport(customer, **_worker["render_args"])
+        if rendered is None:
+            return None, None, None
+        country, doc = rendered
+        if _worker["out_dir"] is None:
+            return country, doc, None
+        return country, write_document(*doc, _worker["out_dir"]), None
+    except Exception as e:
+        return None, None, f"{e}\n{traceback.format_exc()}"
+
+def _render_chunk(customers: List[Dict[str, Any]]) -> List[RenderResult]:
+    return [_render_one(customer) for customer in customers]
+
+def _report_rendered(customer_id: str, country: Optional[str], out_path: Optional[str], dest: Path) -> None:
+    if country is not None:
+        print(f"Rendering passport for country: {country}")
+    if out_path is None:
+        print(f"No passport details for customer {customer_id}, skipping.")
+    else:
+        print(f"Rendered passport for customer {customer_id}. HTML documents to {dest}")
+
+def _render_parallel(args: argparse.Namespace, archive: Optional[tarfile.TarFile]) -> None:
+    dest = args.doc_archive or args.out
+    # Workers write files themselves; archive members are added here, in order
+    worker_out_dir = None if archive is not None else args.out
+    with ProcessPoolExecutor(max_workers=args.jobs,
+                             initializer=_init_worker,
+                             initargs=(args.schema, args.render_templates_root, worker_out_dir)) as ex:
+        def collect(chunk: List[Dict[str, Any]], future: Future) -> None:
+            for customer, (country, result, error) in zip(chunk, future.result()):
+                customer_id = customer.get('customer_id', '?')
+                if error is not None:
+                    msg, _, tb = error.partition("\n")
+                    print(f"[warn] Failed to render passport for {customer_id}: {msg}")
+                    print(tb, end="", file=sys.stderr)
+                    continue
+                if archive is not None and result is not None:
+                    result = write_document(*result, args.out, archive)
+                _report_rendered(customer_id, country, result, dest)
+
+        # Bounded window of in-flight chunks, collected in input order: workers stay busy
+        # while the parent reports (and archives) finished chunks, with no batch barrier
+        pending: deque = deque()
+        customers = iter_jsonl(args.customer_list)
+        while True:
+            chunk = list(islice(customers, RENDER_CHUNKSIZE))
+            if not chunk:
+                break
+            pending.append((chunk, ex.submit(_render_chunk, chunk)))
+            if len(pending) >= args.jobs * RENDER_WINDOW:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+
+def _render_serial(args: argparse.Namespace, archive: Optional[tarfile.TarFile]) -> None:
+    # Schema and templates are fixed for the run: load and compile them once
+    cfg = load_json(args.schema)
+    extract = compile_extractor(compile_fields(cfg["fields"]))
+    env = template_env(args.render_templates_root)
+    templates = load_passport_templates(env, cfg["template"])
+    output_name = passport_output_name(cfg)
+    dest = args.doc_archive or args.out
+
+    for customer in iter_jsonl(args.customer_list):
+        country = out_path = None
+        try:
+            rendered = render_passport(
+                customer=customer,
+                output_name=output_name,
+                extract=extract,
+                templates=templates,
+            )
+            if rendered is not None:
+                country, doc = rendered
+                out_path = write_document(*doc, args.out, archive)
+        except Exception as e:
+            print(f"[warn] Failed to render passport for {customer.get('customer_id', '?')}: {e}")
+            traceback.print_exc()
+        else:
+            _report_rendered(customer.get('customer_id', '?'), country, out_path, dest)
 
 def main():
     ap = argparse.ArgumentParser(description="Render Passport HTML for customers from JSONL.")
@@ -100,27 +222,29 @@ def main():
     ap.add_argument("--schema", type=Path, required=True, help="Path to passport field-declaration JSON")
     ap.add_argument("--render_templates_root", type=Path, default=Path("."), help="Root folder for HTML templates")
     ap.add_argument("--out", type=Path, default=Path("render_docs_out/"), help="Output folder for rendered documents")
+    ap.add_argument("--doc-archive", type=Path, default=None,
+                    help="Write all rendered documents into this uncompressed tar instead of one file each")
+    ap.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                    help="Render processes (default: CPU count - 1); 1 renders in-process")
 
     args = ap.parse_args()
+    warn_without_escape_speedups()
 
-    with args.customer_list.open("r", encoding="utf-8") as f:
-        for line in f:
-            customer = json.loads(line)
-            try:
-                out_path = render_passport_html(
-                    customer=customer,
-                    schema_path=args.schema,
-                    render_templates_root=args.render_templates_root,
-                    out_dir=args.out,
-                )
-            except Exception as e:
-                print(f"[warn] Failed to render passport for {customer.get('customer_id', '?')}: {e}")
-                traceback.print_exc()
-
-            if (out_path is None): 
-                print(f"No passport details for customer {customer.get('customer_id', '?')}, skipping.")
-            else:
-                print(f"Rendered passport for customer {customer.get('customer_id', '?')}. HTML documents to {args.out}")
+    if args.doc_archive is not None:
+        args.doc_archive.parent.mkdir(parents=True, exist_ok=True)
+        archive = tarfile.open(args.doc_archive, mode="w|")
+    else:
+        args.out.mkdir(parents=True, exist_ok=True)
+        archive = None
+
+    try:
+        if args.jobs > 1:
+            _render_parallel(args, archive)
+        else:
+            _render_serial(args, archive)
+    finally:
+        if archive is not None:
+            archive.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file